@@ -3,31 +3,158 @@ FastAPI backend for Grocery Remix.
 Exposes recipe generation and storage as REST API endpoints.
 """
 
+import asyncio
+import json
+import os
 import sys
+import time
+from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
+from typing import Annotated
+import orjson
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, StringConstraints
 
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
-from recipe_generator import RecipeGenerator
+from config import NUM_PARALLEL
 from storage import RecipeStorage
 
+# Queued LLM jobs start as soon as one of MAX_CONCURRENT_JOBS slots frees
+# up, so LMStudio's parallel decode slots stay busy and a short request
+# never waits for a long one running beside it to finish. Match it to the
+# number of parallel request slots configured in LMStudio.
+MAX_CONCURRENT_JOBS = NUM_PARALLEL
+
+# Upper bound on recipes requested in a single /batch_generate call
+MAX_BATCH_REQUESTS = 32
+
+# Admission control: new LLM work is rejected with 429 once the queue is full
+# or the estimated queueing delay exceeds QUEUE_WAIT_SLA, so latency stays
+# bounded under overload instead of growing inside LMStudio
+MAX_QUEUE_SIZE = 64
+QUEUE_WAIT_SLA = 60.0  # seconds
+
+
+async def job_worker(queue: asyncio.Queue, slots: asyncio.Semaphore, running: set):
+    """Start each queued LLM job as its own task once a concurrency slot is free."""
+    while True:
+        job, future = await queue.get()
+        if future.done():
+            continue  # Client went away while queued
+        await slots.acquire()
+        if future.done():
+            slots.release()
+            continue  # Client went away while waiting for a slot
+        task = asyncio.create_task(job())
+        running.add(task)
+        task.add_done_callback(partial(finish_job, future, time.monotonic(), slots, running))
+
+
+def finish_job(future: asyncio.Future, started: float, slots: asyncio.Semaphore,
+               running: set, task: asyncio.Task):
+    """Free a finished job's slot and hand its outcome to the waiting request."""
+    slots.release()
+    running.discard(task)
+    if task.cancelled():
+        future.cancel()
+        return
+
+    # Moving average of job latency, used to estimate queueing delay
+    elapsed = time.monotonic() - started
+    app.state.avg_job_latency = 0.8 * app.state.avg_job_latency + 0.2 * elapsed
+
+    error = task.exception()
+    if future.done():
+        return  # Client went away while the job ran
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(task.result())
+
+
+def enqueue(job) -> asyncio.Future:
+    """
+    Queue an LLM job for the job worker, subject to admission control.
+
+    Returns:
+        asyncio.Future: Resolves with the job's result once it has run
+
+    Raises:
+        HTTPException: 429 if the queue is full or the estimated wait is too long
+    """
+    queue = app.state.queue
+    # Little's Law: queued jobs drain MAX_CONCURRENT_JOBS at a time
+    est_wait = queue.qsize() * app.state.avg_job_latency / MAX_CONCURRENT_JOBS
+    if est_wait > QUEUE_WAIT_SLA:
+        raise HTTPException(status_code=429, detail="Server overloaded, retry with backoff")
+
+    future = asyncio.get_running_loop().create_future()
+    try:
+        queue.put_nowait((job, future))
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Server overloaded, retry with backoff")
+    return future
+
+
+async def submit(job):
+    """Queue an LLM job for the job worker and wait for its result."""
+    return await enqueue(job)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, which encodes straight to bytes."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the job worker on startup; stop it and checkpoint storage on shutdown."""
+    app.state.queue = asyncio.Queue(maxsize=MAX_QUEUE_SIZE)
+    app.state.slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+    app.state.avg_job_latency = 0.0
+    running = set()  # Strong references keep running jobs from being collected
+    worker = asyncio.create_task(job_worker(app.state.queue, app.state.slots, running))
+    yield
+    worker.cancel()
+    for task in list(running):
+        task.cancel()
+    # Storage is opened at import and outlives the app, so only compact the
+    # write-ahead log here; closing it would break a restarted lifespan
+    storage.checkpoint()
+
+
 app = FastAPI(
     title="Grocery Remix API",
     description="Local AI-powered recipe generation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# Enable CORS for React frontend
+# Enable CORS for React frontend (Vite dev server by default).
+# Set CORS_ORIGINS to a comma-separated list to allow other origins.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get(
+        "CORS_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173"
+    ).split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
 # Initialize services
@@ -39,26 +166,38 @@ def get_generator():
     """Lazy load the generator to avoid startup errors if LMStudio isn't running."""
     global generator
     if generator is None:
+        # Imported here so the openai client stack loads on first LLM use
+        from recipe_generator import RecipeGenerator
         generator = RecipeGenerator()
     return generator
 
 
 # Request/Response Models
+# Size caps reject oversized payloads with a 422 before any LLM work is done
+Ingredient = Annotated[str, StringConstraints(max_length=100)]
+DietaryFilter = Annotated[str, StringConstraints(max_length=50)]
+
+
 class RecipeRequest(BaseModel):
-    ingredients: list[str]
-    dietary_filters: list[str] = []
+    ingredients: list[Ingredient] = Field(min_length=1, max_length=50)
+    dietary_filters: list[DietaryFilter] = Field(default=[], max_length=20)
+    max_tokens: int = Field(default=600, ge=100, le=2000)
+
+
+class BatchRecipeRequest(BaseModel):
+    requests: list[RecipeRequest]
 
 
 class SubstitutionRequest(BaseModel):
-    ingredient: str
-    context: str | None = None
+    ingredient: str = Field(max_length=200)
+    context: str | None = Field(default=None, max_length=1000)
 
 
 class SaveRecipeRequest(BaseModel):
-    title: str
-    content: str
-    ingredients: list[str] = []
-    dietary_filters: list[str] = []
+    title: str = Field(max_length=200)
+    content: str = Field(max_length=20000)
+    ingredients: list[Ingredient] = Field(default=[], max_length=50)
+    dietary_filters: list[DietaryFilter] = Field(default=[], max_length=20)
 
 
 class MacroRequest(BaseModel):
@@ -66,7 +205,8 @@ class MacroRequest(BaseModel):
     protein: int | None = None
     carbs: int | None = None
     fat: int | None = None
-    dietary_filters: list[str] = []
+    dietary_filters: list[DietaryFilter] = Field(default=[], max_length=20)
+    max_tokens: int = Field(default=600, ge=100, le=2000)
 
 
 # Endpoints
@@ -86,39 +226,130 @@ def health_check():
 
 
 @app.post("/generate")
-def generate_recipe(request: RecipeRequest):
+async def generate_recipe(request: RecipeRequest):
     """Generate a recipe based on ingredients."""
-    if not request.ingredients:
-        raise HTTPException(status_code=400, detail="No ingredients provided")
-
     try:
         gen = get_generator()
-        recipe = gen.generate_recipe(request.ingredients, request.dietary_filters)
+        recipe = await submit(
+            partial(gen.generate_recipe, request.ingredients, request.dietary_filters,
+                    request.max_tokens)
+        )
         return {
             "recipe": recipe,
             "ingredients": request.ingredients,
             "dietary_filters": request.dietary_filters
         }
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ConnectionError as e:
         raise HTTPException(status_code=503, detail=f"LMStudio connection failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/batch_generate")
+async def batch_generate(body: BatchRecipeRequest):
+    """Generate several recipes in one call, run concurrently on the LLM."""
+    if not body.requests:
+        raise HTTPException(status_code=400, detail="No recipe requests provided")
+    if len(body.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many recipe requests (max {MAX_BATCH_REQUESTS})"
+        )
+
+    queue = app.state.queue
+    if queue.maxsize - queue.qsize() < len(body.requests):
+        raise HTTPException(status_code=429, detail="Server overloaded, retry with backoff")
+
+    try:
+        gen = get_generator()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    recipes = await asyncio.gather(
+        *[submit(partial(gen.generate_recipe, r.ingredients, r.dietary_filters, r.max_tokens))
+          for r in body.requests],
+        return_exceptions=True
+    )
+
+    results = []
+    for r, recipe in zip(body.requests, recipes):
+        result = {"ingredients": r.ingredients, "dietary_filters": r.dietary_filters}
+        if isinstance(recipe, HTTPException):
+            result["error"] = recipe.detail
+        elif isinstance(recipe, TimeoutError):
+            result["error"] = str(recipe)
+        elif isinstance(recipe, ConnectionError):
+            result["error"] = f"LMStudio connection failed: {str(recipe)}"
+        elif isinstance(recipe, Exception):
+            result["error"] = str(recipe)
+        else:
+            result["recipe"] = recipe
+        results.append(result)
+
+    return {"results": results, "count": len(results)}
+
+
+@app.post("/generate/stream")
+async def generate_recipe_stream(request: RecipeRequest):
+    """Stream a recipe as Server-Sent Events while it is generated."""
+    try:
+        gen = get_generator()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # The stream runs inside a queued job that holds a concurrency slot until
+    # the stream ends, so it is admitted and bounded like any other LLM call
+    slot_acquired = asyncio.get_running_loop().create_future()
+    stream_done = asyncio.Event()
+
+    async def hold_slot():
+        if not slot_acquired.done():
+            slot_acquired.set_result(None)
+        await stream_done.wait()
+
+    enqueue(hold_slot)
+
+    async def event_gen():
+        try:
+            await slot_acquired
+            async for token in gen.generate_recipe_stream(
+                request.ingredients, request.dietary_filters, request.max_tokens
+            ):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except ConnectionError as e:
+            yield f"data: {json.dumps({'error': f'LMStudio connection failed: {e}'})}\n\n"
+            return
+        finally:
+            stream_done.set()
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream")
+
+
 @app.post("/substitute")
-def suggest_substitution(request: SubstitutionRequest):
+async def suggest_substitution(request: SubstitutionRequest):
     """Get substitution suggestions for an ingredient."""
     if not request.ingredient:
         raise HTTPException(status_code=400, detail="No ingredient provided")
 
     try:
         gen = get_generator()
-        suggestion = gen.suggest_substitution(request.ingredient, request.context)
+        suggestion = await submit(
+            partial(gen.suggest_substitution, request.ingredient, request.context)
+        )
         return {
             "ingredient": request.ingredient,
             "context": request.context,
             "suggestion": suggestion
         }
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ConnectionError as e:
         raise HTTPException(status_code=503, detail=f"LMStudio connection failed: {str(e)}")
     except Exception as e:
@@ -126,20 +357,22 @@ def suggest_substitution(request: SubstitutionRequest):
 
 
 @app.post("/generate-from-macros")
-def generate_from_macros(request: MacroRequest):
+async def generate_from_macros(request: MacroRequest):
     """Generate a recipe based on target macronutrients."""
     if not any([request.calories, request.protein, request.carbs, request.fat]):
         raise HTTPException(status_code=400, detail="Provide at least one macro target")
 
     try:
         gen = get_generator()
-        recipe = gen.generate_from_macros(
+        recipe = await submit(partial(
+            gen.generate_from_macros,
             calories=request.calories,
             protein=request.protein,
             carbs=request.carbs,
             fat=request.fat,
-            dietary_filters=request.dietary_filters
-        )
+            dietary_filters=request.dietary_filters,
+            max_tokens=request.max_tokens
+        ))
         return {
             "recipe": recipe,
             "targets": {
@@ -150,6 +383,10 @@ def generate_from_macros(request: MacroRequest):
             },
             "dietary_filters": request.dietary_filters
         }
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ConnectionError as e:
         raise HTTPException(status_code=503, detail=f"LMStudio connection failed: {str(e)}")
     except Exception as e:
@@ -159,7 +396,7 @@ def generate_from_macros(request: MacroRequest):
 @app.get("/recipes")
 def get_all_recipes():
     """Get all saved recipes."""
-    recipes = storage.get_all_recipes()
+    recipes = storage.get_all_recipes()  # Cached by storage itself
     return {"recipes": recipes, "count": len(recipes)}
 
 
@@ -195,10 +432,20 @@ def delete_recipe(recipe_id: int):
 @app.get("/recipes/search/{query}")
 def search_recipes(query: str):
     """Search recipes by title or ingredient."""
-    results = storage.search_recipes(query)
+    results = storage.search_recipes(query)  # One full-text index query
     return {"results": results, "count": len(results)}
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # With uvicorn[standard] installed, "auto" selects uvloop and httptools
+    # (uvloop has no Windows build, so it falls back to asyncio there)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        log_level="warning",
+        access_log=False
+    )
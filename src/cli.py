@@ -3,13 +3,14 @@ Command-line interface for Grocery Remix.
 Provides user-friendly menus for recipe generation and management.
 """
 
+import asyncio
+import os
 import sys
 from pathlib import Path
 
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from recipe_generator import RecipeGenerator
 from storage import RecipeStorage
 
 
@@ -26,6 +27,25 @@ class GroceryRemixCLI:
         "nut-free"
     ]
 
+    HEADER = "\n".join([
+        "=" * 60,
+        "  GROCERY REMIX - Local AI Recipe Generator",
+        "  Powered by LMStudio + Llama 3.1",
+        "=" * 60
+    ])
+
+    MENU = "\n".join([
+        "\n--- Main Menu ---",
+        "[1] Generate Recipe (from ingredients)",
+        "[2] Generate Recipe (from macros)",
+        "[3] Ingredient Substitution",
+        "[4] View Saved Recipes",
+        "[5] Search Recipes",
+        "[6] Delete Recipe",
+        "[0] Exit",
+        "-" * 20
+    ])
+
     def __init__(self):
         """Initialize CLI with generator and storage."""
         self.generator = None  # Lazy load to avoid connection errors at startup
@@ -33,17 +53,36 @@ class GroceryRemixCLI:
         self.last_recipe = None  # Store last generated recipe for saving
         self.last_ingredients = None
         self.last_filters = None
+        # One loop for the whole session so the async LLM client's pooled
+        # connections stay bound to a live loop between menu actions
+        self.loop = asyncio.new_event_loop()
+
+    def run_async(self, coro):
+        """Run a coroutine to completion on the CLI's event loop."""
+        return self.loop.run_until_complete(coro)
+
+    def print_stream(self, chunks) -> str:
+        """Print an async stream of text chunks as they arrive and return the full text."""
+        async def consume():
+            parts = []
+            async for chunk in chunks:
+                print(chunk, end="", flush=True)
+                parts.append(chunk)
+            print()
+            return "".join(parts)
+
+        return self.run_async(consume())
 
     def _ensure_generator(self) -> bool:
         """Ensure generator is initialized and connected."""
         if self.generator is None:
             print("\nConnecting to LMStudio...")
             try:
+                # Imported here so browsing saved recipes never loads the LLM stack
+                from recipe_generator import RecipeGenerator
                 self.generator = RecipeGenerator()
                 # Test connection
-                from llm_client import LMStudioClient
-                client = LMStudioClient()
-                if not client.test_connection():
+                if not self.run_async(self.generator.client.test_connection()):
                     print("\n[ERROR] Cannot connect to LMStudio.")
                     print("Make sure LMStudio is running with the server started.")
                     return False
@@ -56,26 +95,16 @@ class GroceryRemixCLI:
 
     def clear_screen(self):
         """Clear terminal screen."""
-        print("\n" * 50)
+        sys.stdout.write("\x1b[2J\x1b[H")
+        sys.stdout.flush()
 
     def print_header(self):
         """Print application header."""
-        print("=" * 60)
-        print("  GROCERY REMIX - Local AI Recipe Generator")
-        print("  Powered by LMStudio + Llama 3.1")
-        print("=" * 60)
+        print(self.HEADER)
 
     def print_menu(self):
         """Print main menu options."""
-        print("\n--- Main Menu ---")
-        print("[1] Generate Recipe (from ingredients)")
-        print("[2] Generate Recipe (from macros)")
-        print("[3] Ingredient Substitution")
-        print("[4] View Saved Recipes")
-        print("[5] Search Recipes")
-        print("[6] Delete Recipe")
-        print("[0] Exit")
-        print("-" * 20)
+        print(self.MENU)
 
     def get_input(self, prompt: str) -> str:
         """Get user input with prompt."""
@@ -141,8 +170,8 @@ class GroceryRemixCLI:
         print("-" * 40)
 
         try:
-            recipe = self.generator.generate_recipe(ingredients, filters)
-            print(recipe)
+            # Streamed so the recipe starts appearing as soon as the first tokens do
+            recipe = self.print_stream(self.generator.generate_recipe_stream(ingredients, filters))
             print("-" * 40)
 
             # Store for potential saving
@@ -223,13 +252,13 @@ class GroceryRemixCLI:
         print("-" * 40)
 
         try:
-            recipe = self.generator.generate_from_macros(
+            recipe = self.run_async(self.generator.generate_from_macros(
                 calories=int(calories) if calories else None,
                 protein=int(protein) if protein else None,
                 carbs=int(carbs) if carbs else None,
                 fat=int(fat) if fat else None,
                 dietary_filters=filters
-            )
+            ))
             print(recipe)
             print("-" * 40)
 
@@ -265,7 +294,9 @@ class GroceryRemixCLI:
         print("-" * 40)
 
         try:
-            result = self.generator.suggest_substitution(ingredient, context if context else None)
+            result = self.run_async(
+                self.generator.suggest_substitution(ingredient, context if context else None)
+            )
             print(result)
             print("-" * 40)
         except ConnectionError as e:
@@ -391,9 +422,14 @@ class GroceryRemixCLI:
 
 def main():
     """Entry point for the CLI."""
+    if os.name == "nt":
+        os.system("")  # Enables ANSI escape handling in the Windows console
     try:
         cli = GroceryRemixCLI()
-        cli.run()
+        try:
+            cli.run()
+        finally:
+            cli.storage.close()  # Checkpoints and truncates the write-ahead log
     except KeyboardInterrupt:
         print("\n\nExiting... Goodbye!")
         sys.exit(0)
@@ -0,0 +1,36 @@
+"""
+Environment settings shared by Grocery Remix modules.
+Kept free of heavy imports so the API and CLI can load it cheaply.
+"""
+
+import os
+
+
+def positive_int_env(name: str, default: int) -> int:
+    """
+    Read a positive integer setting from the environment.
+
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset
+
+    Returns:
+        int: The configured value
+
+    Raises:
+        ValueError: If the variable is set but is not a positive integer
+    """
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise ValueError(f"{name} must be a positive integer, got {raw!r}")
+    return value
+
+
+# LMStudio's parallel request slots; LLM calls beyond this are queued
+NUM_PARALLEL = positive_int_env("LMSTUDIO_NUM_PARALLEL", 4)
@@ -3,12 +3,33 @@ LMStudio API client for Grocery Remix.
 Handles connection to local LMStudio server running Llama 3.1 8B Instruct.
 """
 
-from openai import OpenAI
+import asyncio
+import importlib.util
+import os
+
+import httpx
+from openai import NOT_GIVEN, AsyncOpenAI
+
+# Model identifier as loaded in LMStudio (e.g. a Q4_K_M GGUF build)
+DEFAULT_MODEL = os.environ.get("LMSTUDIO_MODEL", "meta-llama-3.1-8b-instruct")
+
+# Process-wide client returned by LMStudioClient.shared()
+_shared_client = None
+
+
+class LMStudioTimeoutError(ConnectionError, TimeoutError):
+    """LMStudio did not answer in time (catchable as either base class)."""
 
 
 class LMStudioClient:
     """Client for interacting with LMStudio's local API."""
 
+    # Connection pool shared by all requests made through one client
+    POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+    TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+    # HTTP/2 needs the optional h2 package (httpx[http2])
+    HTTP2 = importlib.util.find_spec("h2") is not None
+
     def __init__(self, base_url="http://localhost:1234/v1", api_key="lm-studio"):
         """
         Initialize LMStudio client.
@@ -17,13 +38,33 @@ class LMStudioClient:
             base_url: LMStudio server URL (default: http://localhost:1234/v1)
             api_key: API key (LMStudio doesn't require real key, but library needs one)
         """
-        self.client = OpenAI(
+        http_client = httpx.AsyncClient(
+            http2=self.HTTP2,
+            limits=self.POOL_LIMITS,
+            timeout=self.TIMEOUT
+        )
+        self.client = AsyncOpenAI(
             base_url=base_url,
-            api_key=api_key  # LMStudio doesn't validate this, but OpenAI client requires it
+            api_key=api_key,  # LMStudio doesn't validate this, but OpenAI client requires it
+            http_client=http_client
         )
-        self.model = "meta-llama-3.1-8b-instruct"
+        self.model = DEFAULT_MODEL
 
-    def generate_response(self, prompt, system_prompt=None, temperature=0.7, max_tokens=1000):
+    @classmethod
+    def shared(cls):
+        """
+        Get the process-wide client, creating it on first use.
+
+        Returns:
+            LMStudioClient: Shared client with a pooled HTTP connection
+        """
+        global _shared_client
+        if _shared_client is None:
+            _shared_client = cls()
+        return _shared_client
+
+    async def generate_response(self, prompt, system_prompt=None, temperature=0.7, max_tokens=1000,
+                                stop=None, cache_prompt=False, model=None):
         """
         Generate a response from the LLM.
 
@@ -32,10 +73,72 @@ class LMStudioClient:
             system_prompt: System prompt to set context (optional)
             temperature: Sampling temperature (0.0-1.0, higher = more creative)
             max_tokens: Maximum tokens to generate
+            stop: Sequences that end generation early (optional)
+            cache_prompt: Ask the server to reuse its cached KV state for a
+                matching prompt prefix, so requests sharing a system prompt
+                skip re-processing it (optional)
+            model: Model to use instead of the client's default (optional)
 
         Returns:
             str: Generated response from the LLM
         """
+        try:
+            response = await self.client.chat.completions.create(
+                model=model or self.model,
+                messages=self._build_messages(prompt, system_prompt),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=stop if stop else NOT_GIVEN,
+                extra_body={"cache_prompt": True} if cache_prompt else None
+            )
+
+            return response.choices[0].message.content
+
+        except Exception as e:
+            raise ConnectionError(f"Failed to connect to LMStudio: {str(e)}")
+
+    async def generate_response_stream(self, prompt, system_prompt=None, temperature=0.7, max_tokens=1000,
+                                       stop=None, cache_prompt=False, model=None):
+        """
+        Stream a response from the LLM as it is generated.
+
+        Args:
+            prompt: User prompt/question
+            system_prompt: System prompt to set context (optional)
+            temperature: Sampling temperature (0.0-1.0, higher = more creative)
+            max_tokens: Maximum tokens to generate
+            stop: Sequences that end generation early (optional)
+            cache_prompt: Ask the server to reuse its cached KV state for a
+                matching prompt prefix, so requests sharing a system prompt
+                skip re-processing it (optional)
+            model: Model to use instead of the client's default (optional)
+
+        Yields:
+            str: Chunks of generated text
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                model=model or self.model,
+                messages=self._build_messages(prompt, system_prompt),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=stop if stop else NOT_GIVEN,
+                extra_body={"cache_prompt": True} if cache_prompt else None,
+                stream=True
+            )
+
+            # Closing the response when the consumer stops early tells
+            # LMStudio to stop decoding tokens nobody will read
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            raise ConnectionError(f"Failed to connect to LMStudio: {str(e)}")
+
+    def _build_messages(self, prompt, system_prompt=None):
+        """Build the chat messages list for a prompt."""
         messages = []
 
         if system_prompt:
@@ -49,48 +152,37 @@ class LMStudioClient:
             "content": prompt
         })
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-
-            return response.choices[0].message.content
-
-        except Exception as e:
-            raise ConnectionError(f"Failed to connect to LMStudio: {str(e)}")
+        return messages
 
-    def test_connection(self):
+    async def test_connection(self):
         """
         Test connection to LMStudio server.
 
+        Lists the server's models rather than running a generation, so the
+        check returns in milliseconds instead of a full LLM round trip.
+
         Returns:
             bool: True if connection successful, False otherwise
         """
         try:
-            response = self.generate_response(
-                prompt="Say 'Hello' if you can hear me.",
-                max_tokens=50
-            )
+            await self.client.models.list()
             return True
         except Exception as e:
             print(f"Connection test failed: {str(e)}")
             return False
 
 
-if __name__ == "__main__":
-    # Test the connection
+async def main():
+    """Test the connection and run a sample recipe query."""
     print("Testing LMStudio connection...")
-    client = LMStudioClient()
+    client = LMStudioClient.shared()
 
-    if client.test_connection():
+    if await client.test_connection():
         print("[OK] Successfully connected to LMStudio!")
 
         # Try a simple recipe query
         print("\nTesting recipe generation...")
-        response = client.generate_response(
+        response = await client.generate_response(
             system_prompt="You are a helpful chef assistant that suggests recipes.",
             prompt="I have chicken, rice, and broccoli. Suggest a simple recipe.",
             temperature=0.7,
@@ -102,4 +194,8 @@ if __name__ == "__main__":
         print("\nMake sure:")
         print("1. LMStudio is running")
         print("2. The server is started (click 'Start Server' in LMStudio)")
-        print("3. meta-llama-3.1-8b-instruct model is loaded")
+        print(f"3. {client.model} model is loaded")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,12 +3,34 @@ Recipe Generator for Grocery Remix.
 Uses LMStudioClient to generate recipes and ingredient substitutions.
 """
 
-from llm_client import LMStudioClient
+import asyncio
+import hashlib
+import json
+import os
+from functools import partial
+
+from cachetools import TTLCache
+
+from config import NUM_PARALLEL
+from llm_client import LMStudioClient, LMStudioTimeoutError
+
+# User prompt templates, filled with format_map() per request. Optional
+# sections are appended through the suffix templates, so a given request
+# always renders to the same bytes.
+_RECIPE_TEMPLATE = "Create a recipe using these ingredients: {ingredients}{filters}"
+_MACRO_TEMPLATE = "Create a meal that meets these nutritional targets: {targets}{filters}"
+_SUBSTITUTION_TEMPLATE = "What can I substitute for {ingredient}?{context}"
+_FILTERS_SUFFIX = "\n\nDietary requirements: {filters}"
+_CONTEXT_SUFFIX = "\n\nContext: {context}"
 
 
 class RecipeGenerator:
     """Generates recipes and ingredient substitutions using LLM."""
 
+    # System prompts are static and always sent first, with the per-request
+    # details (ingredients, filters, targets) only in the user prompt after
+    # them. LMStudio can then reuse the cached system prompt prefix across
+    # requests of the same kind, so keep dynamic content out of these.
     RECIPE_SYSTEM_PROMPT = """You are an experienced home chef and nutritionist who creates practical, delicious recipes.
 When given ingredients, you create a complete recipe with:
 
@@ -20,11 +42,13 @@ When given ingredients, you create a complete recipe with:
 6. **Tips** - 1-2 helpful cooking tips
 
 Keep recipes accessible for home cooks. Be specific about cooking times and temperatures.
-Always include nutritional estimates per serving."""
+Always include nutritional estimates per serving.
+End your response with a line containing only END."""
 
     SUBSTITUTION_SYSTEM_PROMPT = """You are a knowledgeable chef who helps with ingredient substitutions.
 Provide practical alternatives that maintain the dish's flavor and texture.
-Be concise - give 2-3 substitution options with brief explanations of how they'll affect the dish."""
+Be concise - give 2-3 substitution options with brief explanations of how they'll affect the dish.
+End your response with a line containing only END."""
 
     MACRO_SYSTEM_PROMPT = """You are an experienced chef and nutritionist who creates meals to meet specific nutritional targets.
 When given macro targets, you create a complete recipe that hits those targets as closely as possible.
@@ -38,68 +62,284 @@ Your response must include:
 5. **Instructions** - Clear, numbered steps
 6. **Tips** - 1-2 helpful tips
 
-Focus on whole, nutritious ingredients. Be precise with quantities to match the macro targets."""
+Focus on whole, nutritious ingredients. Be precise with quantities to match the macro targets.
+End your response with a line containing only END."""
+
+    # Markers that end a response early instead of decoding up to max_tokens;
+    # the system prompts ask the model to finish with the END sentinel
+    RECIPE_STOP = ["\nEND"]
+    SUBSTITUTION_STOP = ["\nEND"]
+
+    # Models per task; None uses the client's default (LMSTUDIO_MODEL).
+    # Substitutions are short, so a small model such as llama-3.2-3b-instruct
+    # answers them several times faster with little loss in quality.
+    RECIPE_MODEL = os.environ.get("LMSTUDIO_RECIPE_MODEL")
+    SUBST_MODEL = os.environ.get("LMSTUDIO_SUBST_MODEL")
+
+    # Concurrent LLM calls per batch; match LMStudio's parallel request slots
+    MAX_PARALLEL = NUM_PARALLEL
+
+    # Longest a single LLM call may take before it is abandoned
+    LLM_TIMEOUT = 60.0  # seconds
+
+    # Response cache for repeated recipe, substitution and macro queries
+    CACHE_MAXSIZE = 10000
+    CACHE_TTL = 3600  # seconds
 
     def __init__(self, client: LMStudioClient = None):
         """
         Initialize RecipeGenerator.
 
         Args:
-            client: LMStudioClient instance (creates one if not provided)
+            client: LMStudioClient instance (uses the shared client if not provided)
+        """
+        self.client = client if client else LMStudioClient.shared()
+        self._cache = TTLCache(maxsize=self.CACHE_MAXSIZE, ttl=self.CACHE_TTL)
+        # LLM calls currently running, by cache key, so identical concurrent
+        # requests share one call instead of each missing the cache
+        self._inflight = {}
+
+    @staticmethod
+    def _cache_key(prompt: str, system_prompt: str, temperature: float, max_tokens: int,
+                   stop: list[str] = None, model: str = None) -> str:
+        """Hash a request into a response cache key."""
+        return hashlib.blake2b(json.dumps({
+            "model": model,
+            "sys": system_prompt,
+            "prompt": prompt,
+            "t": temperature,
+            "max": max_tokens,
+            "stop": stop
+        }, sort_keys=True).encode()).hexdigest()
+
+    async def _cached_response(self, prompt: str, system_prompt: str,
+                               temperature: float, max_tokens: int,
+                               stop: list[str] = None, model: str = None) -> str:
+        """
+        Return a cached LLM response, calling the LLM only on a cache miss.
+
+        Keys are BLAKE2b hashes of the request, so no prompt text is kept
+        in the cache index. A request identical to one already in flight
+        waits for that call rather than starting its own.
+        """
+        key = self._cache_key(prompt, system_prompt, temperature, max_tokens, stop, model)
+
+        if key in self._cache:
+            return self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call_llm(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=stop,
+                cache_prompt=True,
+                model=model
+            ))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._finish_call, key))
+
+        # Shielded so one caller giving up doesn't cancel the call for the rest
+        return await asyncio.shield(task)
+
+    def _finish_call(self, key: str, task: asyncio.Future):
+        """Cache a finished in-flight call's result and stop tracking it."""
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._cache[key] = task.result()
+
+    async def _call_llm(self, **kwargs) -> str:
         """
-        self.client = client if client else LMStudioClient()
+        Call the LLM, giving up after LLM_TIMEOUT seconds.
 
-    def generate_recipe(self, ingredients: list[str], dietary_filters: list[str] = None) -> str:
+        Raises:
+            LMStudioTimeoutError: If LMStudio does not respond in time
+        """
+        try:
+            return await asyncio.wait_for(
+                self.client.generate_response(**kwargs),
+                timeout=self.LLM_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise LMStudioTimeoutError(f"LMStudio timeout after {self.LLM_TIMEOUT:g}s")
+
+    async def generate_recipe(self, ingredients: list[str], dietary_filters: list[str] = None,
+                              max_tokens: int = 600, model: str = None) -> str:
         """
         Generate a recipe based on available ingredients.
 
         Args:
             ingredients: List of ingredients to use
             dietary_filters: Optional dietary restrictions (e.g., ["vegetarian", "gluten-free"])
+            max_tokens: Maximum tokens to generate
+            model: Model to use (defaults to RECIPE_MODEL)
 
         Returns:
             str: Generated recipe text
         """
-        ingredients_text = ", ".join(ingredients)
-        prompt = f"Create a recipe using these ingredients: {ingredients_text}"
+        return await self._cached_response(
+            prompt=self._recipe_prompt(ingredients, dietary_filters),
+            system_prompt=self.RECIPE_SYSTEM_PROMPT,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            stop=self.RECIPE_STOP,
+            model=model or self.RECIPE_MODEL
+        )
+
+    async def generate_recipes_batch(self, ingredient_lists: list[list[str]],
+                                     dietary_filters: list[str] = None,
+                                     max_tokens: int = 600) -> list[str]:
+        """
+        Generate several recipes concurrently.
+
+        At most MAX_PARALLEL requests are in flight at once, so wall-clock
+        time is roughly that of the slowest recipe rather than the sum.
+
+        Args:
+            ingredient_lists: One list of ingredients per recipe
+            dietary_filters: Optional dietary restrictions applied to every recipe
+            max_tokens: Maximum tokens to generate per recipe
+
+        Returns:
+            list: Generated recipe texts, in the same order as ingredient_lists
+        """
+        semaphore = asyncio.Semaphore(self.MAX_PARALLEL)
 
-        if dietary_filters:
-            filters_text = ", ".join(dietary_filters)
-            prompt += f"\n\nDietary requirements: {filters_text}"
+        async def generate(ingredients):
+            async with semaphore:
+                return await self.generate_recipe(ingredients, dietary_filters, max_tokens)
 
-        return self.client.generate_response(
+        return await asyncio.gather(*[generate(ingredients) for ingredients in ingredient_lists])
+
+    async def generate_recipe_stream(self, ingredients: list[str],
+                                     dietary_filters: list[str] = None,
+                                     max_tokens: int = 600, model: str = None):
+        """
+        Stream a recipe based on available ingredients.
+
+        Cached recipes are yielded whole; otherwise chunks are yielded as the
+        LLM produces them and the full text is cached once complete.
+
+        Args:
+            ingredients: List of ingredients to use
+            dietary_filters: Optional dietary restrictions (e.g., ["vegetarian", "gluten-free"])
+            max_tokens: Maximum tokens to generate
+            model: Model to use (defaults to RECIPE_MODEL)
+
+        Yields:
+            str: Chunks of generated recipe text
+
+        Raises:
+            LMStudioTimeoutError: If LMStudio sends nothing for LLM_TIMEOUT seconds
+        """
+        model = model or self.RECIPE_MODEL
+        prompt = self._recipe_prompt(ingredients, dietary_filters)
+        key = self._cache_key(prompt, self.RECIPE_SYSTEM_PROMPT, 0.7, max_tokens,
+                              self.RECIPE_STOP, model)
+
+        if key in self._cache:
+            yield self._cache[key]
+            return
+
+        stream = self.client.generate_response_stream(
             prompt=prompt,
             system_prompt=self.RECIPE_SYSTEM_PROMPT,
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=max_tokens,
+            stop=self.RECIPE_STOP,
+            cache_prompt=True,
+            model=model
         )
+        chunks = []
+        try:
+            while True:
+                # An idle timeout rather than a total one: a stream that keeps
+                # producing tokens may run longer than LLM_TIMEOUT overall
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=self.LLM_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise LMStudioTimeoutError(
+                        f"LMStudio sent nothing for {self.LLM_TIMEOUT:g}s"
+                    ) from None
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            await stream.aclose()
+
+        self._cache[key] = "".join(chunks)
+
+    @staticmethod
+    def _normalize_terms(terms: list[str] = None) -> list[str]:
+        """
+        Strip, lowercase, dedupe and sort a list of ingredients or filters.
 
-    def suggest_substitution(self, ingredient: str, context: str = None) -> str:
+        Equivalent lists ("Chicken, garlic" vs "garlic, chicken ") then build
+        the same prompt, sharing both our cache and LMStudio's prefix cache.
+        """
+        return sorted({term.strip().lower() for term in terms or []} - {""})
+
+    @classmethod
+    def _recipe_prompt(cls, ingredients: list[str], dietary_filters: list[str] = None) -> str:
+        """Build the user prompt for a recipe request."""
+        return _RECIPE_TEMPLATE.format_map({
+            "ingredients": ", ".join(cls._normalize_terms(ingredients)),
+            "filters": cls._filters_suffix(dietary_filters)
+        })
+
+    @classmethod
+    def _filters_suffix(cls, dietary_filters: list[str] = None) -> str:
+        """Render the dietary requirements section, or "" when there are none."""
+        dietary_filters = cls._normalize_terms(dietary_filters)
+        if not dietary_filters:
+            return ""
+        return _FILTERS_SUFFIX.format_map({"filters": ", ".join(dietary_filters)})
+
+    @staticmethod
+    def _substitution_prompt(ingredient: str, context: str = None) -> str:
+        """Build the user prompt for a substitution request."""
+        return _SUBSTITUTION_TEMPLATE.format_map({
+            "ingredient": ingredient,
+            "context": _CONTEXT_SUFFIX.format_map({"context": context}) if context else ""
+        })
+
+    @classmethod
+    def _macro_prompt(cls, targets: list[str], dietary_filters: list[str] = None) -> str:
+        """Build the user prompt for a macro-targeted meal request."""
+        return _MACRO_TEMPLATE.format_map({
+            "targets": ", ".join(targets),
+            "filters": cls._filters_suffix(dietary_filters)
+        })
+
+    async def suggest_substitution(self, ingredient: str, context: str = None,
+                                   model: str = None) -> str:
         """
         Suggest substitutions for an ingredient.
 
         Args:
             ingredient: The ingredient to substitute
             context: Optional context about the recipe or dish
+            model: Model to use (defaults to SUBST_MODEL)
 
         Returns:
             str: Substitution suggestions
         """
-        prompt = f"What can I substitute for {ingredient}?"
-
-        if context:
-            prompt += f"\n\nContext: {context}"
-
-        return self.client.generate_response(
-            prompt=prompt,
+        return await self._cached_response(
+            prompt=self._substitution_prompt(ingredient, context),
             system_prompt=self.SUBSTITUTION_SYSTEM_PROMPT,
             temperature=0.5,
-            max_tokens=300
+            max_tokens=300,
+            stop=self.SUBSTITUTION_STOP,
+            model=model or self.SUBST_MODEL
         )
 
-    def generate_from_macros(self, calories: int = None, protein: int = None,
-                              carbs: int = None, fat: int = None,
-                              dietary_filters: list[str] = None) -> str:
+    async def generate_from_macros(self, calories: int = None, protein: int = None,
+                                   carbs: int = None, fat: int = None,
+                                   dietary_filters: list[str] = None,
+                                   max_tokens: int = 600) -> str:
         """
         Generate a recipe based on target macronutrients.
 
@@ -109,6 +349,7 @@ Focus on whole, nutritious ingredients. Be precise with quantities to match the
             carbs: Target carbohydrates in grams
             fat: Target fat in grams
             dietary_filters: Optional dietary restrictions
+            max_tokens: Maximum tokens to generate
 
         Returns:
             str: Generated recipe text
@@ -126,21 +367,18 @@ Focus on whole, nutritious ingredients. Be precise with quantities to match the
         if not targets:
             return "Please provide at least one macro target (calories, protein, carbs, or fat)."
 
-        prompt = f"Create a meal that meets these nutritional targets: {', '.join(targets)}"
-
-        if dietary_filters:
-            filters_text = ", ".join(dietary_filters)
-            prompt += f"\n\nDietary requirements: {filters_text}"
-
-        return self.client.generate_response(
-            prompt=prompt,
+        return await self._cached_response(
+            prompt=self._macro_prompt(targets, dietary_filters),
             system_prompt=self.MACRO_SYSTEM_PROMPT,
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=max_tokens,
+            stop=self.RECIPE_STOP,
+            model=self.RECIPE_MODEL
         )
 
 
-if __name__ == "__main__":
+async def main():
+    """Run sample generations against a live LMStudio server."""
     print("Testing Recipe Generator...")
     print("=" * 50)
 
@@ -153,7 +391,7 @@ if __name__ == "__main__":
     print(f"Ingredients: {ingredients}")
     print("\nGenerating recipe...\n")
     try:
-        recipe = generator.generate_recipe(ingredients)
+        recipe = await generator.generate_recipe(ingredients)
         print(recipe)
     except ConnectionError as e:
         print(f"Error: {e}")
@@ -168,7 +406,7 @@ if __name__ == "__main__":
     print(f"Dietary filters: {dietary_filters}")
     print("\nGenerating recipe...\n")
     try:
-        recipe = generator.generate_recipe(ingredients, dietary_filters)
+        recipe = await generator.generate_recipe(ingredients, dietary_filters)
         print(recipe)
     except ConnectionError as e:
         print(f"Error: {e}")
@@ -183,10 +421,14 @@ if __name__ == "__main__":
     print(f"Context: {context}")
     print("\nFinding substitutions...\n")
     try:
-        substitution = generator.suggest_substitution(ingredient, context)
+        substitution = await generator.suggest_substitution(ingredient, context)
         print(substitution)
     except ConnectionError as e:
         print(f"Error: {e}")
 
     print("\n" + "=" * 50)
     print("Testing complete!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,51 +1,285 @@
 """
 Recipe storage for Grocery Remix.
-Handles saving and loading recipes to/from JSON.
+Handles saving and loading recipes to/from SQLite.
 """
 
 import json
+import logging
 import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib codec
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _loads(raw: bytes | str):
+    """Parse JSON (orjson.JSONDecodeError subclasses json's)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _format_ns(timestamp_ns: int) -> str:
+    """Format a time.time_ns() timestamp as a local ISO 8601 string."""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+
+def _parse_iso_ns(saved_at: str) -> int:
+    """Convert an ISO 8601 string, as the legacy JSON file stores, to nanoseconds."""
+    return int(datetime.fromisoformat(saved_at).timestamp() * 1e9)
+
+
+def _dumps(data) -> str:
+    """Serialize data to a compact JSON string."""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ingredients_json TEXT NOT NULL DEFAULT '[]',
+    dietary_filters_json TEXT NOT NULL DEFAULT '[]',
+    saved_at_ns INTEGER NOT NULL  -- time.time_ns(), formatted on read
+);
+
+-- Full-text index over title and ingredients, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+    title, ingredients_json, content='recipes', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS recipes_ai AFTER INSERT ON recipes BEGIN
+    INSERT INTO recipes_fts(rowid, title, ingredients_json)
+    VALUES (new.id, new.title, new.ingredients_json);
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_ad AFTER DELETE ON recipes BEGIN
+    INSERT INTO recipes_fts(recipes_fts, rowid, title, ingredients_json)
+    VALUES ('delete', old.id, old.title, old.ingredients_json);
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_au AFTER UPDATE ON recipes BEGIN
+    INSERT INTO recipes_fts(recipes_fts, rowid, title, ingredients_json)
+    VALUES ('delete', old.id, old.title, old.ingredients_json);
+    INSERT INTO recipes_fts(rowid, title, ingredients_json)
+    VALUES (new.id, new.title, new.ingredients_json);
+END;
+"""
+
+RECIPE_COLUMNS = "id, title, content, ingredients_json, dietary_filters_json, saved_at_ns"
+
 
 class RecipeStorage:
-    """Manages saving and loading recipes to JSON storage."""
+    """Manages saving and loading recipes to SQLite storage."""
 
     def __init__(self, storage_path: str = None):
         """
         Initialize RecipeStorage.
 
         Args:
-            storage_path: Path to JSON file (defaults to data/saved_recipes.json)
+            storage_path: Path to SQLite database (defaults to data/recipes.db)
         """
         if storage_path is None:
-            # Default to data/saved_recipes.json relative to project root
+            # Default to data/recipes.db relative to project root
             project_root = Path(__file__).parent.parent
-            storage_path = project_root / "data" / "saved_recipes.json"
+            storage_path = project_root / "data" / "recipes.db"
 
         self.storage_path = Path(storage_path)
-        self._ensure_storage_exists()
-
-    def _ensure_storage_exists(self):
-        """Create storage file and directory if they don't exist."""
+        # Recipes saved by earlier versions, imported on first run
+        self.legacy_path = self.storage_path.with_name("saved_recipes.json")
+        # One connection shared by the API's worker threads, serialized by a lock
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+        # Recipes already read or written, by ID; dropped when another
+        # connection (e.g. the CLI alongside the API) changes the database
+        self._by_id: dict[int, dict] = {}
+        # Every recipe in ID order, loaded on first get_all_recipes()
+        self._all: list[dict] | None = None
+        # Set inside bulk(), where writes share one transaction
+        self._in_bulk = False
+        self._data_version = None
+        self._migrate_legacy_json()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database, applying pragmas and creating the schema."""
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if not self.storage_path.exists():
-            self._save_data({"recipes": []})
-
-    def _load_data(self) -> dict:
-        """Load data from JSON file."""
+        conn = sqlite3.connect(self.storage_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Commits append to the write-ahead log instead of rewriting pages in
+        # place; checkpoints fold it back into the database file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA journal_size_limit=67108864")  # trim WAL back to 64MB
+        conn.execute("PRAGMA synchronous=FULL")  # fsync every commit
+        conn.execute("PRAGMA cache_size=-20000")  # ~20MB page cache
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _migrate_legacy_json(self):
+        """Import recipes from saved_recipes.json into an empty database."""
+        if not self.legacy_path.exists() or self.count_recipes():
+            return
+
+        # A corrupt legacy file raises rather than being silently skipped,
+        # so saved recipes are never lost without notice
         try:
-            with open(self.storage_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {"recipes": []}
+            with open(self.legacy_path, "rb") as f:
+                data = _loads(f.read())
+        except FileNotFoundError:
+            return
+
+        recipes = data.get("recipes", []) if isinstance(data, dict) else data
+        if not isinstance(recipes, list):
+            # Left in place rather than retired, so nothing is lost
+            logger.warning("Not importing %s: no list of recipes found", self.legacy_path)
+            return
+
+        rows = self._legacy_rows(recipes)
+        # Recipes keeping their old ID go first, so IDs assigned to the rest
+        # can't collide with one of them
+        rows.sort(key=lambda row: row[0] is None)
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO recipes ({RECIPE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+        # Only retire the JSON file once the import has committed; os.replace
+        # is atomic, so a crash leaves either the old name or the new one
+        os.replace(self.legacy_path, self.legacy_path.with_suffix(".json.migrated"))
+
+    @staticmethod
+    def _legacy_rows(recipes: list) -> list[tuple]:
+        """
+        Convert legacy JSON recipes to database rows.
 
-    def _save_data(self, data: dict):
-        """Save data to JSON file."""
-        with open(self.storage_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        Unreadable records are skipped, and a duplicate or invalid ID or
+        saved_at is replaced, each with a logged warning, so one bad record
+        never blocks startup or the rest of the import.
+        """
+        rows = []
+        seen_ids = set()
+        for index, r in enumerate(recipes):
+            try:
+                recipe_id = r.get("id")
+                try:
+                    recipe_id = int(recipe_id) if recipe_id is not None else None
+                except (TypeError, ValueError):
+                    logger.warning("Legacy recipe %d: invalid id %r, assigning a new one",
+                                   index, recipe_id)
+                    recipe_id = None
+                if recipe_id in seen_ids:
+                    logger.warning("Legacy recipe %d: duplicate id %d, assigning a new one",
+                                   index, recipe_id)
+                    recipe_id = None
+
+                try:
+                    saved_at_ns = _parse_iso_ns(r["saved_at"]) if r.get("saved_at") else time.time_ns()
+                except (TypeError, ValueError):
+                    logger.warning("Legacy recipe %d: invalid saved_at %r, using the current time",
+                                   index, r.get("saved_at"))
+                    saved_at_ns = time.time_ns()
+
+                row = (
+                    recipe_id,
+                    str(r.get("title") or ""),
+                    str(r.get("content") or ""),
+                    _dumps(r.get("ingredients") or []),
+                    _dumps(r.get("dietary_filters") or []),
+                    saved_at_ns
+                )
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.warning("Skipping unreadable legacy recipe %d: %s", index, e)
+                continue
+
+            if recipe_id is not None:
+                seen_ids.add(recipe_id)
+            rows.append(row)
+        return rows
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the lock for a write, committing it unless inside bulk()."""
+        with self._lock:
+            if self._in_bulk:
+                yield
+            else:
+                with self._conn:
+                    yield
+
+    @contextmanager
+    def bulk(self):
+        """
+        Group many saves and deletes into a single transaction.
+
+        Writes inside the block are committed together on exit, with one
+        fsync instead of one per write, or all rolled back if it raises.
+        Other threads wait for the block to finish.
+
+        Example:
+            with storage.bulk():
+                for recipe in cookbook:
+                    storage.save_recipe(**recipe)
+        """
+        with self._lock:
+            if self._in_bulk:  # Nested: the outer block commits
+                yield
+                return
+            self._in_bulk = True
+            try:
+                with self._conn:
+                    yield
+            except BaseException:
+                # Rolled back, so forget recipes cached by the writes
+                self._by_id.clear()
+                self._all = None
+                raise
+            finally:
+                self._in_bulk = False
+
+    def _check_external_changes(self):
+        """Drop in-memory caches if another connection committed changes."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._by_id.clear()
+            self._all = None
+            self._data_version = version
+
+    def _has_all_recipes(self) -> bool:
+        """
+        Whether _by_id holds every recipe, so an ID missing from it doesn't exist.
+
+        True once get_all_recipes() has loaded the full list, which saves and
+        deletes then keep in step with _by_id. Call with the lock held, after
+        _check_external_changes().
+        """
+        return self._all is not None
+
+    @staticmethod
+    def _row_to_recipe(row: sqlite3.Row) -> dict:
+        """Convert a database row to a recipe dictionary."""
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "content": row["content"],
+            "ingredients": _loads(row["ingredients_json"]),
+            "dietary_filters": _loads(row["dietary_filters_json"]),
+            "saved_at": _format_ns(row["saved_at_ns"])
+        }
 
     def save_recipe(self, title: str, content: str, ingredients: list[str] = None,
                     dietary_filters: list[str] = None) -> int:
@@ -61,22 +295,34 @@ class RecipeStorage:
         Returns:
             int: ID of the saved recipe
         """
-        data = self._load_data()
-
-        # Generate unique ID
-        recipe_id = max([r.get("id", 0) for r in data["recipes"]], default=0) + 1
-
         recipe = {
-            "id": recipe_id,
             "title": title,
             "content": content,
             "ingredients": ingredients or [],
-            "dietary_filters": dietary_filters or [],
-            "saved_at": datetime.now().isoformat()
+            "dietary_filters": dietary_filters or []
         }
-
-        data["recipes"].append(recipe)
-        self._save_data(data)
+        saved_at_ns = time.time_ns()
+
+        with self._transaction():
+            cursor = self._conn.execute(
+                "INSERT INTO recipes (title, content, ingredients_json, dietary_filters_json, saved_at_ns) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    recipe["title"],
+                    recipe["content"],
+                    _dumps(recipe["ingredients"]),
+                    _dumps(recipe["dietary_filters"]),
+                    saved_at_ns
+                )
+            )
+            recipe_id = cursor.lastrowid
+            recipe = self._by_id[recipe_id] = {
+                "id": recipe_id, **recipe, "saved_at": _format_ns(saved_at_ns)
+            }
+            # Copied rather than appended to, so callers holding the old list
+            # are unaffected; IDs only grow, so it stays in ID order
+            if self._all is not None:
+                self._all = [*self._all, recipe]
 
         return recipe_id
 
@@ -84,11 +330,21 @@ class RecipeStorage:
         """
         Get all saved recipes.
 
+        The list is cached and shared between calls until the next save or
+        delete, so callers must not mutate it or the recipes in it.
+
         Returns:
             list: List of recipe dictionaries
         """
-        data = self._load_data()
-        return data.get("recipes", [])
+        with self._lock:
+            self._check_external_changes()
+            if self._all is None:
+                rows = self._conn.execute(
+                    f"SELECT {RECIPE_COLUMNS} FROM recipes ORDER BY id"
+                ).fetchall()
+                self._all = [self._row_to_recipe(row) for row in rows]
+                self._by_id.update((recipe["id"], recipe) for recipe in self._all)
+            return self._all
 
     def get_recipe(self, recipe_id: int) -> dict | None:
         """
@@ -100,11 +356,19 @@ class RecipeStorage:
         Returns:
             dict: Recipe data or None if not found
         """
-        recipes = self.get_all_recipes()
-        for recipe in recipes:
-            if recipe.get("id") == recipe_id:
-                return recipe
-        return None
+        with self._lock:
+            self._check_external_changes()
+            recipe = self._by_id.get(recipe_id)
+            if recipe is None:
+                if self._has_all_recipes():
+                    return None
+                row = self._conn.execute(
+                    f"SELECT {RECIPE_COLUMNS} FROM recipes WHERE id = ?", (recipe_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                recipe = self._by_id[recipe_id] = self._row_to_recipe(row)
+        return recipe
 
     def delete_recipe(self, recipe_id: int) -> bool:
         """
@@ -116,46 +380,72 @@ class RecipeStorage:
         Returns:
             bool: True if deleted, False if not found
         """
-        data = self._load_data()
-        original_count = len(data["recipes"])
-
-        data["recipes"] = [r for r in data["recipes"] if r.get("id") != recipe_id]
-
-        if len(data["recipes"]) < original_count:
-            self._save_data(data)
-            return True
-        return False
+        with self._lock:
+            self._check_external_changes()
+            if recipe_id not in self._by_id and self._has_all_recipes():
+                return False
+
+            with self._transaction():
+                cursor = self._conn.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+                self._by_id.pop(recipe_id, None)
+                if cursor.rowcount and self._all is not None:
+                    self._all = [recipe for recipe in self._all if recipe["id"] != recipe_id]
+        return cursor.rowcount > 0
 
     def search_recipes(self, query: str) -> list[dict]:
         """
         Search recipes by title or ingredients.
 
+        Every word in the query must match a word, or the start of a word,
+        in the title or ingredients (e.g. "chick lemon" finds "Lemon Chicken"),
+        case-insensitively, via the full-text index. A query with no words
+        (e.g. "" or "!!") matches nothing and returns an empty list.
+
         Args:
             query: Search term
 
         Returns:
             list: Matching recipes
         """
-        query = query.lower()
-        recipes = self.get_all_recipes()
-
-        results = []
-        for recipe in recipes:
-            # Search in title
-            if query in recipe.get("title", "").lower():
-                results.append(recipe)
-                continue
-            # Search in ingredients
-            for ingredient in recipe.get("ingredients", []):
-                if query in ingredient.lower():
-                    results.append(recipe)
-                    break
-
-        return results
+        # No lower()/casefold() here: the FTS5 unicode61 tokenizer folds case
+        # (and diacritics) identically for the index and the query, whereas
+        # casefold() would turn "straße" into "strasse", which the index lacks
+        tokens = re.findall(r"\w+", query)
+        if not tokens:
+            return []
+
+        # FTS5 intersects the posting lists of space-separated prefix terms
+        match = " ".join(f'"{token}"*' for token in tokens)
+
+        with self._lock:
+            self._check_external_changes()
+            if self._all == []:  # Known to be empty
+                return []
+            rows = self._conn.execute(
+                f"SELECT {RECIPE_COLUMNS} FROM recipes WHERE id IN "
+                "(SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH ?) ORDER BY id",
+                (match,)
+            ).fetchall()
+        return [self._row_to_recipe(row) for row in rows]
 
     def count_recipes(self) -> int:
         """Return the number of saved recipes."""
-        return len(self.get_all_recipes())
+        with self._lock:
+            self._check_external_changes()
+            if self._all is not None:
+                return len(self._all)
+            return self._conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def checkpoint(self):
+        """Fold the write-ahead log into the database and truncate it."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Checkpoint the write-ahead log and close the connection."""
+        with self._lock:
+            self.checkpoint()
+            self._conn.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+"""
+Prompt template drift tests for RecipeGenerator.
+
+LMStudio's prefix cache and our response cache only hit when prompts are
+byte-identical, so any change to the rendered prompts must be deliberate:
+update the pinned hashes below together with the template change.
+"""
+
+import hashlib
+import sys
+import unittest
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from recipe_generator import RecipeGenerator
+
+
+def prompt_hash(prompt: str) -> str:
+    """SHA-256 of a rendered prompt."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class TestPromptTemplates(unittest.TestCase):
+    """Pin the exact bytes of every user prompt template."""
+
+    def test_recipe_prompt(self):
+        prompt = RecipeGenerator._recipe_prompt(["chicken", "garlic", "lemon"])
+        self.assertEqual(
+            prompt_hash(prompt),
+            "2e636cf14a16b81f8725e9d3c45f111460bca9f4a5591bf0776c2ab3b84f7083"
+        )
+
+    def test_recipe_prompt_with_filters(self):
+        prompt = RecipeGenerator._recipe_prompt(
+            ["chicken", "garlic", "lemon"], ["gluten-free", "vegan"]
+        )
+        self.assertEqual(
+            prompt_hash(prompt),
+            "603734aaa8568d0fb523a31c1fc1e84a47c3d47b3490f69f1eda4c06cde86aa5"
+        )
+
+    def test_macro_prompt(self):
+        prompt = RecipeGenerator._macro_prompt(["500 calories", "30g protein"])
+        self.assertEqual(
+            prompt_hash(prompt),
+            "808b628f7cad234a39f089b7358caca657e93e4070559b8600b9d1dd3a3960bb"
+        )
+
+    def test_macro_prompt_with_filters(self):
+        prompt = RecipeGenerator._macro_prompt(["500 calories", "30g protein"], ["keto"])
+        self.assertEqual(
+            prompt_hash(prompt),
+            "41647af27e2694b3577e5a8484ec4c0a798d02513bc9d81c8663d35f838f9c29"
+        )
+
+    def test_substitution_prompt(self):
+        prompt = RecipeGenerator._substitution_prompt("butter")
+        self.assertEqual(
+            prompt_hash(prompt),
+            "617fea23ee7335f2f81669a2b7a3c398b81a89477b6eaedd1367a604976ad8e9"
+        )
+
+    def test_substitution_prompt_with_context(self):
+        prompt = RecipeGenerator._substitution_prompt("butter", "chocolate chip cookies")
+        self.assertEqual(
+            prompt_hash(prompt),
+            "dd3845e4658f1d96ee09277209102bd32dd4932d6f6b40ef6b41c4998877a2d1"
+        )
+
+
+class TestPromptNormalization(unittest.TestCase):
+    """Equivalent requests must render the same prompt."""
+
+    def test_recipe_prompt_ignores_order_case_and_duplicates(self):
+        self.assertEqual(
+            RecipeGenerator._recipe_prompt([" Lemon", "garlic", "CHICKEN", "chicken", ""],
+                                           ["Vegan ", "gluten-free", "vegan"]),
+            RecipeGenerator._recipe_prompt(["chicken", "garlic", "lemon"],
+                                           ["gluten-free", "vegan"])
+        )
+
+    def test_empty_filters_add_no_suffix(self):
+        self.assertEqual(
+            RecipeGenerator._recipe_prompt(["chicken"], []),
+            RecipeGenerator._recipe_prompt(["chicken"], ["  "])
+        )
+        self.assertNotIn("Dietary requirements", RecipeGenerator._recipe_prompt(["chicken"], []))
+
+
+if __name__ == "__main__":
+    unittest.main()